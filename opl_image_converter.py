@@ -1,11 +1,20 @@
 import os
+import sys
+import sqlite3
+import subprocess
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
+from PIL import Image
 import threading
-import shutil
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from collections import OrderedDict
 from datetime import datetime
 
+# Rechazar imágenes de más de 200 millones de píxeles (Pillow lanza
+# DecompressionBombError al superar el doble de este valor)
+Image.MAX_IMAGE_PIXELS = 100_000_000
+
 class ImageProcessor:
     """Clase para procesar imágenes: convertir y redimensionar"""
     
@@ -21,74 +30,135 @@ class ImageProcessor:
     }
     
     # Formatos de entrada soportados
-    SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tiff', '.gif']
+    SUPPORTED_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tiff', '.gif')
+    
+    # Umbrales para usar procesos en lugar de hilos en lotes grandes
+    # (se puede forzar con la variable de entorno OPL_USE_PROCESSES=1 o 0)
+    PROCESS_MIN_FILES = 50
+    PROCESS_MIN_AVG_BYTES = 5 * 1024 * 1024
+    
+    # Lienzos de fondo negro reutilizados por cada hilo de conversión
+    _canvas_local = threading.local()
     
     @staticmethod
     def is_supported_format(file_path):
         """Verifica si el formato del archivo es soportado"""
-        ext = os.path.splitext(file_path)[1].lower()
-        return ext in ImageProcessor.SUPPORTED_FORMATS
+        # Probar primero sin convertir a minúsculas (caso más común)
+        if file_path.endswith(ImageProcessor.SUPPORTED_SUFFIXES):
+            return True
+        return file_path.lower().endswith(ImageProcessor.SUPPORTED_SUFFIXES)
     
     @staticmethod
-    def convert_resize_image(input_path, output_path, image_type, maintain_aspect=True):
-        """Convierte y redimensiona una imagen según el tipo especificado"""
+    def _iter_image_files(folder):
+        """Recorre una carpeta recursivamente y devuelve las rutas con extensión soportada"""
+        subfolders = []
         try:
-            # Abrir la imagen
-            img = Image.open(input_path)
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subfolders.append(entry.path)
+                    elif entry.is_file() and entry.name.lower().endswith(ImageProcessor.SUPPORTED_SUFFIXES):
+                        yield entry.path
+        except OSError:
+            # Ignorar carpetas sin permisos, igual que os.walk
+            return
+        
+        for subfolder in subfolders:
+            yield from ImageProcessor._iter_image_files(subfolder)
+    
+    @staticmethod
+    def _transform(img, image_type, maintain_aspect=True, canvas=None):
+        """Convierte y redimensiona una imagen ya abierta y la devuelve sin guardarla
+        
+        Si se pasa un lienzo del tamaño objetivo se reutiliza en lugar de crear uno nuevo.
+        """
+        # Obtener dimensiones objetivo
+        target_width, target_height = ImageProcessor.DIMENSIONS.get(image_type, (0, 0))
+        
+        if target_width == 0 or target_height == 0:
+            raise ValueError(f"Tipo de imagen no válido: {image_type}")
+        
+        # Decodificar JPEG a escala reducida (no hace nada en otros formatos
+        # ni si la imagen ya fue cargada)
+        img.draft('RGB', (target_width * 2, target_height * 2))
+        
+        # Convertir a RGB si es necesario (para formatos como RGBA)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        
+        # Redimensionar manteniendo la relación de aspecto si se solicita
+        if maintain_aspect:
+            img_width, img_height = img.size
+            aspect_ratio = img_width / img_height
+            target_ratio = target_width / target_height
             
-            # Convertir a RGB si es necesario (para formatos como RGBA)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
+            if aspect_ratio > target_ratio:
+                # Imagen más ancha que el objetivo
+                new_width = target_width
+                new_height = int(new_width / aspect_ratio)
+            else:
+                # Imagen más alta que el objetivo
+                new_height = target_height
+                new_width = int(new_height * aspect_ratio)
             
-            # Obtener dimensiones objetivo
-            target_width, target_height = ImageProcessor.DIMENSIONS.get(image_type, (0, 0))
+            # Usar una imagen con fondo negro del tamaño objetivo
+            if canvas is not None:
+                new_img = canvas
+                new_img.paste((0, 0, 0), (0, 0, target_width, target_height))
+            else:
+                new_img = Image.new('RGB', (target_width, target_height), (0, 0, 0))
             
-            if target_width == 0 or target_height == 0:
-                raise ValueError(f"Tipo de imagen no válido: {image_type}")
+            # Redimensionar la imagen original
+            resized_img = img.resize((new_width, new_height), Image.LANCZOS, reducing_gap=2.0)
             
-            # Redimensionar manteniendo la relación de aspecto si se solicita
-            if maintain_aspect:
-                img_width, img_height = img.size
-                aspect_ratio = img_width / img_height
-                target_ratio = target_width / target_height
-                
-                if aspect_ratio > target_ratio:
-                    # Imagen más ancha que el objetivo
-                    new_width = target_width
-                    new_height = int(new_width / aspect_ratio)
-                else:
-                    # Imagen más alta que el objetivo
-                    new_height = target_height
-                    new_width = int(new_height * aspect_ratio)
-                
-                # Crear una nueva imagen con fondo negro del tamaño objetivo
-                new_img = Image.new('RGB', (target_width, target_height), (0, 0, 0))
-                
-                # Redimensionar la imagen original
-                resized_img = img.resize((new_width, new_height), Image.LANCZOS)
-                
-                # Calcular posición para centrar
-                left = (target_width - new_width) // 2
-                top = (target_height - new_height) // 2
-                
-                # Pegar la imagen redimensionada en el centro
-                new_img.paste(resized_img, (left, top))
-                img = new_img
-            else:
-                # Redimensionar sin mantener la relación de aspecto
-                img = img.resize((target_width, target_height), Image.LANCZOS)
+            # Calcular posición para centrar
+            left = (target_width - new_width) // 2
+            top = (target_height - new_height) // 2
+            
+            # Pegar la imagen redimensionada en el centro
+            new_img.paste(resized_img, (left, top))
+            img = new_img
+        else:
+            # Redimensionar sin mantener la relación de aspecto
+            img = img.resize((target_width, target_height), Image.LANCZOS, reducing_gap=2.0)
+        
+        return img
+    
+    @staticmethod
+    def convert_resize_image(input_path, output_path, image_type, maintain_aspect=True, canvas=None):
+        """Convierte y redimensiona una imagen según el tipo especificado"""
+        try:
+            # Abrir la imagen (se cierra, liberando la imagen decodificada,
+            # en cuanto está transformada)
+            with Image.open(input_path) as source_img:
+                img = ImageProcessor._transform(source_img, image_type, maintain_aspect, canvas)
             
-            # Guardar como PNG
-            img.save(output_path, 'PNG')
+            # Guardar como PNG (compresión rápida, las imágenes de OPL son pequeñas)
+            img.save(output_path, 'PNG', compress_level=1, optimize=False)
             return True, output_path
         
         except Exception as e:
             return False, str(e)
     
+    @staticmethod
+    def _thread_canvas(image_type):
+        """Devuelve el lienzo reutilizable del hilo actual para el tipo de imagen"""
+        canvases = getattr(ImageProcessor._canvas_local, "canvases", None)
+        if canvases is None:
+            canvases = ImageProcessor._canvas_local.canvases = {}
+        
+        canvas = canvases.get(image_type)
+        if canvas is None:
+            canvas = Image.new('RGB', ImageProcessor.DIMENSIONS[image_type], (0, 0, 0))
+            canvases[image_type] = canvas
+        return canvas
+    
     @staticmethod
     def batch_process(input_files, output_dir, image_type, maintain_aspect=True, callback=None):
         """Procesa un lote de imágenes"""
         results = []
+        jobs = []
+        seen = {}
         
         for input_file in input_files:
             if not ImageProcessor.is_supported_format(input_file):
@@ -96,34 +166,97 @@ class ImageProcessor:
                 continue
             
             # Generar nombre de archivo de salida
+            # (output_dir es un directorio nuevo por lote, solo pueden chocar
+            # los nombres repetidos dentro del mismo lote; se comparan sin
+            # distinguir mayúsculas porque Windows y macOS no las distinguen)
             base_name = os.path.splitext(os.path.basename(input_file))[0]
-            output_name = f"{base_name}_{image_type}.png"
-            output_path = os.path.join(output_dir, output_name)
-            
-            # Verificar si el archivo ya existe
-            counter = 1
-            while os.path.exists(output_path):
-                output_name = f"{base_name}_{image_type}_{counter}.png"
-                output_path = os.path.join(output_dir, output_name)
-                counter += 1
-            
-            # Procesar la imagen
-            success, message = ImageProcessor.convert_resize_image(
-                input_file, output_path, image_type, maintain_aspect
-            )
+            name_key = os.path.normcase(base_name).casefold()
+            count = seen.get(name_key, 0)
+            if count == 0:
+                output_name = f"{base_name}_{image_type}.png"
+            else:
+                output_name = f"{base_name}_{image_type}_{count}.png"
+            seen[name_key] = count + 1
             
-            results.append((input_file, success, message if not success else output_path))
+            output_path = os.path.join(output_dir, output_name)
+            jobs.append((input_file, output_path))
+        
+        def report(input_file, success, message):
+            results.append((input_file, success, message))
             
             # Llamar al callback si existe
             if callback:
-                callback(input_file, success, message if not success else output_path)
+                callback(input_file, success, message)
+        
+        if ImageProcessor._use_processes(jobs):
+            # Procesos para lotes grandes y pesados
+            # ("spawn" evita duplicar con fork un proceso que ya ejecuta Tk e hilos;
+            # sin max_workers se usa un proceso por CPU, con el límite de 61 en Windows)
+            executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        else:
+            # Hilos (Pillow libera el GIL al decodificar y redimensionar)
+            executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        
+        # Una tarea por imagen para repartir bien la carga entre los trabajadores
+        with executor:
+            futures = {
+                executor.submit(_transform_and_save, input_file, output_path, image_type, maintain_aspect): input_file
+                for input_file, output_path in jobs
+            }
+            
+            # Recoger resultados en este hilo a medida que terminan
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # p. ej. BrokenProcessPool si el sistema mató un proceso por memoria
+                    result = (futures[future], False, str(e) or type(e).__name__)
+                report(*result)
         
         return results
+    
+    @staticmethod
+    def _use_processes(jobs):
+        """Decide si el lote se procesa con procesos en lugar de hilos"""
+        forced = os.environ.get("OPL_USE_PROCESSES")
+        if forced is not None:
+            return forced == "1"
+        
+        if len(jobs) <= ImageProcessor.PROCESS_MIN_FILES:
+            return False
+        
+        # Solo compensa el coste de arrancar procesos con imágenes pesadas
+        total_bytes = 0
+        for input_file, _ in jobs:
+            try:
+                total_bytes += os.path.getsize(input_file)
+            except OSError:
+                pass
+        return total_bytes / len(jobs) > ImageProcessor.PROCESS_MIN_AVG_BYTES
+
+
+def _transform_and_save(input_path, output_path, image_type, maintain_aspect):
+    """Procesa una imagen del lote y devuelve (archivo, éxito, mensaje)
+    
+    Está a nivel de módulo para que ProcessPoolExecutor pueda serializarla.
+    Reutiliza el lienzo del hilo en lugar de crear uno nuevo por imagen.
+    """
+    canvas = None
+    if maintain_aspect and image_type in ImageProcessor.DIMENSIONS:
+        canvas = ImageProcessor._thread_canvas(image_type)
+    
+    success, message = ImageProcessor.convert_resize_image(
+        input_path, output_path, image_type, maintain_aspect, canvas
+    )
+    return input_path, success, message if not success else output_path
 
 
 class OPLImageConverterApp:
     """Aplicación principal con interfaz gráfica"""
     
+    # Texto de la barra de estado mientras se escanea una carpeta
+    SCANNING_STATUS = "Escaneando carpeta..."
+    
     def __init__(self, root):
         self.root = root
         self.root.title("OPL Manager - Conversor de Imágenes")
@@ -138,6 +271,10 @@ class OPLImageConverterApp:
         self.current_preview_index = 0
         self.preview_original = None
         self.preview_processed = None
+        self._preview_cache = OrderedDict()
+        self._preview_token = 0
+        self._scan_token = 0
+        self._preview_executor = ThreadPoolExecutor(max_workers=1)
         
         # Asegurar que existe el directorio de salida
         if not os.path.exists(self.output_dir):
@@ -145,9 +282,13 @@ class OPLImageConverterApp:
         
         # Crear la interfaz
         self._create_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
         
         # Inicializar el historial
         self.history = []
+        self.history_db_file = os.path.join(os.path.expanduser("~"), ".opl_converter_history.db")
+        self.history_lock = threading.Lock()
+        self._open_history_db()
         self._load_history()
     
     def _create_ui(self):
@@ -336,6 +477,7 @@ class OPLImageConverterApp:
         if files:
             # Filtrar solo formatos soportados
             valid_files = [f for f in files if ImageProcessor.is_supported_format(f)]
+            self._cancel_folder_scan()
             self.input_files = valid_files
             self.files_label.config(text=f"{len(valid_files)} archivos seleccionados")
             
@@ -348,20 +490,57 @@ class OPLImageConverterApp:
         folder = filedialog.askdirectory(title="Seleccionar Carpeta con Imágenes")
         
         if folder:
-            # Obtener todos los archivos de la carpeta
-            all_files = []
-            for root, _, files in os.walk(folder):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    if ImageProcessor.is_supported_format(file_path):
-                        all_files.append(file_path)
-            
-            self.input_files = all_files
-            self.files_label.config(text=f"{len(all_files)} archivos seleccionados")
+            # Invalidar cualquier escaneo anterior que siga en curso
+            self._scan_token += 1
             
-            # Actualizar vista previa
-            self.current_preview_index = 0
-            self._update_preview()
+            # Recorrer la carpeta en un hilo separado para no bloquear la interfaz
+            self.status_var.set(self.SCANNING_STATUS)
+            threading.Thread(
+                target=self._scan_folder, args=(self._scan_token, folder), daemon=True
+            ).start()
+    
+    def _cancel_folder_scan(self):
+        """Descarta el resultado de cualquier escaneo de carpeta en curso"""
+        self._scan_token += 1
+        self._end_scan_status()
+    
+    def _end_scan_status(self):
+        """Quita el aviso de escaneo sin pisar otro estado (p. ej. un lote en curso)"""
+        if self.status_var.get() == self.SCANNING_STATUS:
+            self.status_var.set("Listo")
+    
+    def _scan_folder(self, token, folder):
+        """Obtiene todos los archivos soportados de la carpeta (se ejecuta en un hilo)"""
+        try:
+            files_list = list(ImageProcessor._iter_image_files(folder))
+            error = None
+        except Exception as e:
+            # p. ej. RecursionError en árboles de carpetas muy profundos
+            files_list = []
+            error = str(e) or type(e).__name__
+        
+        # Volver al hilo de la interfaz para actualizarla (también si falló)
+        self.root.after(0, self._scan_folder_done, token, files_list, error)
+    
+    def _scan_folder_done(self, token, files_list, error=None):
+        """Actualiza la selección con los archivos encontrados en la carpeta"""
+        # Descartar el resultado si la selección cambió mientras se escaneaba
+        if token != self._scan_token:
+            return
+        
+        self._end_scan_status()
+        
+        if error is not None:
+            # Mantener la selección anterior
+            messagebox.showerror("Error", f"No se pudo escanear la carpeta: {error}")
+            return
+        
+        self.input_files = files_list
+        self.files_label.config(text=f"{len(files_list)} archivos seleccionados")
+        
+        # Actualizar vista previa
+        self.current_preview_index = 0
+        self._update_preview()
     
     def _select_output_dir(self):
         """Abre un diálogo para seleccionar el directorio de salida"""
@@ -373,6 +552,10 @@ class OPLImageConverterApp:
     
     def _update_preview(self):
         """Actualiza la vista previa con la imagen actual"""
+        # Invalidar cualquier vista previa pendiente
+        self._preview_token += 1
+        token = self._preview_token
+        
         if not self.input_files:
             # Limpiar vista previa
             self.preview_original_label.config(image="")
@@ -387,64 +570,110 @@ class OPLImageConverterApp:
         
         # Obtener archivo actual
         current_file = self.input_files[self.current_preview_index]
+        image_type = self.image_type.get()
+        maintain_aspect = self.maintain_aspect.get()
+        max_size = 300
+        
+        # Reutilizar la vista previa si ya se generó antes
+        cache_key = (current_file, image_type, maintain_aspect, max_size)
+        cached = self._preview_cache.get(cache_key)
+        if cached is not None:
+            self._preview_cache.move_to_end(cache_key)
+            self._set_preview_images(*cached)
+            return
+        
+        # Quitar la vista previa anterior mientras se genera la nueva
+        self.preview_original = None
+        self.preview_processed = None
+        self.preview_original_label.config(image="")
+        self.preview_processed_label.config(image="")
+        
+        # Generar la vista previa en segundo plano para no bloquear la navegación
+        self._preview_executor.submit(
+            self._render_preview, token, cache_key,
+            current_file, image_type, maintain_aspect, max_size
+        )
+    
+    def _render_preview(self, token, cache_key, current_file, image_type, maintain_aspect, max_size):
+        """Decodifica y redimensiona la vista previa (se ejecuta en un hilo)"""
+        # Descartar el trabajo si el usuario ya pasó a otra imagen
+        if token != self._preview_token:
+            return
         
         try:
-            # Cargar imagen original
-            img = Image.open(current_file)
-            
-            # Redimensionar para vista previa (manteniendo proporción)
-            img_width, img_height = img.size
-            max_size = 300
-            
-            if img_width > max_size or img_height > max_size:
-                ratio = min(max_size / img_width, max_size / img_height)
-                new_width = int(img_width * ratio)
-                new_height = int(img_height * ratio)
-                img_preview = img.resize((new_width, new_height), Image.LANCZOS)
-            else:
-                img_preview = img.copy()
-            
-            # Convertir a PhotoImage para Tkinter
-            self.preview_original = ImageTk.PhotoImage(img_preview)
-            self.preview_original_label.config(image=self.preview_original)
-            
-            # Crear vista previa procesada
-            # Crear un archivo temporal para la vista previa
-            temp_dir = os.path.join(os.path.expanduser("~"), ".opl_converter_temp")
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir)
-            
-            temp_file = os.path.join(temp_dir, "preview.png")
-            
-            # Procesar la imagen
-            success, _ = ImageProcessor.convert_resize_image(
-                current_file, 
-                temp_file, 
-                self.image_type.get(),
-                self.maintain_aspect.get()
-            )
-            
-            if success:
-                # Cargar imagen procesada
-                processed_img = Image.open(temp_file)
+            # Cargar imagen original (se cierra al salir del bloque, también si falla,
+            # liberando el archivo y la imagen decodificada)
+            with Image.open(current_file) as img:
+                # Decodificar JPEG a escala reducida (no hace nada en otros formatos)
+                img.draft('RGB', (max_size * 2, max_size * 2))
                 
-                # Redimensionar para vista previa si es necesario
-                proc_width, proc_height = processed_img.size
+                # Redimensionar para vista previa (manteniendo proporción)
+                img_width, img_height = img.size
                 
-                if proc_width > max_size or proc_height > max_size:
-                    ratio = min(max_size / proc_width, max_size / proc_height)
-                    new_width = int(proc_width * ratio)
-                    new_height = int(proc_height * ratio)
-                    proc_preview = processed_img.resize((new_width, new_height), Image.LANCZOS)
+                if img_width > max_size or img_height > max_size:
+                    ratio = min(max_size / img_width, max_size / img_height)
+                    new_width = int(img_width * ratio)
+                    new_height = int(img_height * ratio)
+                    img_preview = img.resize((new_width, new_height), Image.BILINEAR)
                 else:
-                    proc_preview = processed_img.copy()
+                    img_preview = img.copy()
                 
-                # Convertir a PhotoImage para Tkinter
-                self.preview_processed = ImageTk.PhotoImage(proc_preview)
-                self.preview_processed_label.config(image=self.preview_processed)
+                # Crear vista previa procesada en memoria
+                processed_img = ImageProcessor._transform(img, image_type, maintain_aspect)
+            
+            # Redimensionar para vista previa si es necesario
+            proc_width, proc_height = processed_img.size
+            
+            if proc_width > max_size or proc_height > max_size:
+                ratio = min(max_size / proc_width, max_size / proc_height)
+                new_width = int(proc_width * ratio)
+                new_height = int(proc_height * ratio)
+                proc_preview = processed_img.resize((new_width, new_height), Image.BILINEAR)
+            else:
+                proc_preview = processed_img
             
         except Exception as e:
-            messagebox.showerror("Error", f"No se pudo cargar la vista previa: {str(e)}")
+            if token == self._preview_token:
+                self.root.after(0, self._show_preview_error, token, str(e))
+            return
+        
+        # Volver al hilo de la interfaz para mostrar el resultado
+        if token == self._preview_token:
+            self.root.after(0, self._show_preview, token, cache_key, img_preview, proc_preview)
+    
+    def _show_preview(self, token, cache_key, img_preview, proc_preview):
+        """Muestra la vista previa generada y la guarda en caché"""
+        # Importar ImageTk solo cuando se genera la primera vista previa
+        from PIL import ImageTk
+        
+        # Convertir a PhotoImage para Tkinter
+        photos = (ImageTk.PhotoImage(img_preview), ImageTk.PhotoImage(proc_preview))
+        
+        # Guardar en caché, descartando la entrada más antigua si se llena
+        self._preview_cache[cache_key] = photos
+        if len(self._preview_cache) > 32:
+            self._preview_cache.popitem(last=False)
+        
+        if token == self._preview_token:
+            self._set_preview_images(*photos)
+    
+    def _show_preview_error(self, token, message):
+        """Informa de un error al generar la vista previa actual"""
+        if token == self._preview_token:
+            messagebox.showerror("Error", f"No se pudo cargar la vista previa: {message}")
+    
+    def _set_preview_images(self, original, processed):
+        """Muestra un par de imágenes en la vista previa"""
+        self.preview_original, self.preview_processed = original, processed
+        self.preview_original_label.config(image=self.preview_original)
+        self.preview_processed_label.config(image=self.preview_processed)
+    
+    def _on_close(self):
+        """Detiene la generación de vistas previas y cierra la ventana"""
+        # Invalidar el trabajo en curso para que no vuelva a usar la ventana destruida
+        self._preview_token += 1
+        self._preview_executor.shutdown(wait=False, cancel_futures=True)
+        self.root.destroy()
     
     def _prev_preview(self):
         """Muestra la imagen anterior en la vista previa"""
@@ -513,9 +742,9 @@ class OPLImageConverterApp:
                 "directory": batch_dir
             }
             
-            self.history.append(history_entry)
-            self._save_history()
-            self._update_history_tree()
+            self._append_history_entry(history_entry)
+            self.history.insert(0, history_entry)
+            self._insert_history_row(history_entry, 0)
             
             # Actualizar estado
             self.status_var.set(f"Completado: {success_count} de {len(self.input_files)} imágenes procesadas correctamente.")
@@ -532,71 +761,128 @@ class OPLImageConverterApp:
     
     def _clear_selection(self):
         """Limpia la selección de archivos"""
+        self._cancel_folder_scan()
         self.input_files = []
+        self._preview_token += 1
         self.files_label.config(text="0 archivos seleccionados")
         self.preview_original_label.config(image="")
         self.preview_processed_label.config(image="")
         self.preview_index_label.config(text="")
     
-    def _load_history(self):
-        """Carga el historial de conversiones"""
-        history_file = os.path.join(os.path.expanduser("~"), ".opl_converter_history.txt")
+    def _open_history_db(self):
+        """Abre (o crea) la base de datos SQLite del historial"""
+        try:
+            self.history_db = sqlite3.connect(self.history_db_file, check_same_thread=False)
+            self.history_db.row_factory = sqlite3.Row
+            self.history_db.execute("PRAGMA journal_mode=WAL")
+            # El timestamp tiene resolución de segundos y puede repetirse entre
+            # lotes, así que cada entrada se identifica por su propio id
+            self.history_db.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "id INTEGER PRIMARY KEY, timestamp TEXT, date TEXT, type TEXT, "
+                "total INT, success INT, directory TEXT)"
+            )
+            self.history_db.execute(
+                "CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)"
+            )
+            self.history_db.commit()
+            self._import_legacy_history()
+        except Exception as e:
+            self.history_db = None
+            print(f"Error al abrir historial: {str(e)}")
+    
+    def _import_legacy_history(self):
+        """Importa el historial de versiones anteriores (archivo de texto) a la base de datos"""
+        legacy_file = os.path.join(os.path.expanduser("~"), ".opl_converter_history.txt")
         
-        if os.path.exists(history_file):
-            try:
-                with open(history_file, "r") as f:
-                    lines = f.readlines()
-                
-                for line in lines:
+        if not os.path.exists(legacy_file):
+            return
+        
+        try:
+            rows = []
+            with open(legacy_file, "r") as f:
+                for line in f:
                     parts = line.strip().split("|")
                     if len(parts) >= 6:
-                        entry = {
-                            "timestamp": parts[0],
-                            "date": parts[1],
-                            "type": parts[2],
-                            "total": int(parts[3]),
-                            "success": int(parts[4]),
-                            "directory": parts[5]
-                        }
-                        self.history.append(entry)
+                        rows.append((parts[0], parts[1], parts[2], int(parts[3]), int(parts[4]), parts[5]))
+            
+            with self.history_lock, self.history_db:
+                self.history_db.executemany(
+                    "INSERT INTO history (timestamp, date, type, total, success, directory) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
                 
-                # Actualizar árbol de historial
-                self._update_history_tree()
-            except Exception as e:
-                print(f"Error al cargar historial: {str(e)}")
+                # Conservar el archivo antiguo como copia para no volver a importarlo
+                # (si falla, se deshace la importación)
+                os.replace(legacy_file, legacy_file + ".bak")
+        except Exception as e:
+            print(f"Error al importar historial antiguo: {str(e)}")
     
-    def _save_history(self):
-        """Guarda el historial de conversiones"""
-        history_file = os.path.join(os.path.expanduser("~"), ".opl_converter_history.txt")
+    def _load_history(self):
+        """Carga el historial de conversiones"""
+        if self.history_db is None:
+            return
+        
+        try:
+            with self.history_lock:
+                rows = self.history_db.execute(
+                    "SELECT id, timestamp, date, type, total, success, directory "
+                    "FROM history ORDER BY timestamp DESC, id DESC"
+                ).fetchall()
+            
+            # Entradas más recientes primero
+            self.history = [dict(row) for row in rows]
+            
+            # Actualizar árbol de historial
+            self._update_history_tree()
+        except Exception as e:
+            print(f"Error al cargar historial: {str(e)}")
+    
+    def _append_history_entry(self, entry):
+        """Guarda una nueva entrada en el historial y le asigna su id"""
+        if self.history_db is None:
+            return
         
         try:
-            with open(history_file, "w") as f:
-                for entry in self.history:
-                    line = f"{entry['timestamp']}|{entry['date']}|{entry['type']}|{entry['total']}|{entry['success']}|{entry['directory']}\n"
-                    f.write(line)
+            with self.history_lock, self.history_db:
+                cursor = self.history_db.execute(
+                    "INSERT INTO history (timestamp, date, type, total, success, directory) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (entry['timestamp'], entry['date'], entry['type'],
+                     entry['total'], entry['success'], entry['directory'])
+                )
+            entry['id'] = cursor.lastrowid
         except Exception as e:
             print(f"Error al guardar historial: {str(e)}")
     
     def _update_history_tree(self):
         """Actualiza el árbol de historial"""
-        # Limpiar árbol
-        for item in self.history_tree.get_children():
-            self.history_tree.delete(item)
-        
-        # Agregar entradas en orden inverso (más recientes primero)
-        for entry in reversed(self.history):
-            status = f"{entry['success']}/{entry['total']}"
-            self.history_tree.insert(
-                "", 
-                "end", 
-                values=(
-                    entry['date'],
-                    entry['type'].capitalize(),
-                    entry['total'],
-                    status
-                ),
-                tags=(entry['timestamp'],)
-            )
+        # Limpiar árbol en una sola llamada
+        self.history_tree.delete(*self.history_tree.get_children())
+        
+        # Ocultar las columnas mientras se insertan las filas para evitar redibujados
+        self.history_tree.configure(displaycolumns=())
+        try:
+            # Agregar entradas (más recientes primero)
+            for entry in self.history:
+                self._insert_history_row(entry)
+        finally:
+            self.history_tree.configure(displaycolumns="#all")
+    
+    def _insert_history_row(self, entry, index="end"):
+        """Inserta una entrada del historial en el árbol"""
+        status = f"{entry['success']}/{entry['total']}"
+        self.history_tree.insert(
+            "", 
+            index, 
+            values=(
+                entry['date'],
+                entry['type'].capitalize(),
+                entry['total'],
+                status
+            ),
+            tags=(entry['id'],) if 'id' in entry else ()
+        )
     
     def _open_history_folder(self, event):
         """Abre la carpeta de una entrada del historial"""
@@ -606,33 +892,40 @@ class OPLImageConverterApp:
         if not selected_item:
             return
         
-        # Obtener timestamp del ítem
-        timestamp = self.history_tree.item(selected_item[0], "tags")[0]
+        # Obtener id de la entrada del ítem
+        tags = self.history_tree.item(selected_item[0], "tags")
         
         # Buscar directorio correspondiente
         directory = None
-        for entry in self.history:
-            if entry['timestamp'] == timestamp:
-                directory = entry['directory']
-                break
+        if tags and self.history_db is not None:
+            with self.history_lock:
+                row = self.history_db.execute(
+                    "SELECT directory FROM history WHERE id = ?", (int(tags[0]),)
+                ).fetchone()
+            if row is not None:
+                directory = row['directory']
         
         if directory and os.path.exists(directory):
             # Abrir carpeta en el explorador de archivos
-            if os.name == 'nt':  # Windows
-                os.startfile(directory)
-            elif os.name == 'posix':  # macOS y Linux
-                try:
-                    # Intentar con xdg-open (Linux)
-                    os.system(f'xdg-open "{directory}"')
-                except:
-                    # Intentar con open (macOS)
-                    os.system(f'open "{directory}"')
+            try:
+                if os.name == 'nt':  # Windows
+                    os.startfile(directory)
+                elif sys.platform == 'darwin':  # macOS
+                    subprocess.Popen(['open', directory])
+                elif os.name == 'posix':  # Linux
+                    subprocess.Popen(['xdg-open', directory])
+            except OSError as e:
+                # p. ej. xdg-open no está instalado
+                messagebox.showerror("Error", f"No se pudo abrir la carpeta: {str(e)}")
         else:
             messagebox.showerror("Error", "No se pudo encontrar la carpeta o ya no existe.")
 
 
 # Función principal para iniciar la aplicación
 def main():
+    # Necesario para ProcessPoolExecutor en ejecutables congelados de Windows
+    multiprocessing.freeze_support()
+    
     root = tk.Tk()
     app = OPLImageConverterApp(root)
     root.mainloop()